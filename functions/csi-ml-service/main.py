@@ -1,9 +1,12 @@
 import os
 import json
 import logging
+import time
+import uuid
+import threading
 import traceback
 import numpy as np
-from datetime import datetime
+from datetime import datetime, timezone
 from flask import Flask, request, jsonify
 from google.cloud import storage, firestore
 
@@ -15,6 +18,28 @@ logger = logging.getLogger(__name__)
 PROJECT_ID = os.environ.get('GOOGLE_CLOUD_PROJECT', 'csi-online-attendance-system')
 BUCKET_NAME = os.environ.get('CSI_DATA_BUCKET', f'{PROJECT_ID}-csi-data')
 
+# 출석 집계 설정
+# ACTIVITY_LOG_MODE: 'event' (예측마다 activity_logs 문서 저장), 'snapshot' (activity_logs 저장 안 함), 'both'
+# - 집계 스냅샷은 모드와 관계없이 SNAPSHOT_INTERVAL_SECONDS마다, 그리고 세션 종료(/close)와
+#   유휴 세션 제거 시 저장되며, 모드는 이벤트 단위 문서를 추가로 남길지만 결정함
+# - 'snapshot' 모드에서는 이벤트 단위 로그가 남지 않으므로, 인스턴스가 재시작/회수되면
+#   마지막 스냅샷 이후 최대 SNAPSHOT_INTERVAL_SECONDS 동안의 이벤트가 유실될 수 있음
+# - 스냅샷은 인스턴스(집계 수명)별 파티션으로 저장되고 요약 조회 시 병합됨
+#   파티션은 SUMMARY_CHUNK_BYTES 단위 문서로 나뉘어 저장되며 한 트랜잭션(최대 500회 쓰기)에
+#   담겨야 하므로, 기본 설정(480개 구간)에서 세션당 학생 수는 약 2만 명까지 저장 가능
+ACTIVITY_LOG_MODE = os.environ.get('ACTIVITY_LOG_MODE', 'event').lower()
+SUMMARY_BUCKET_SECONDS = int(os.environ.get('SUMMARY_BUCKET_SECONDS', 60))
+SUMMARY_MAX_BUCKETS = int(os.environ.get('SUMMARY_MAX_BUCKETS', 480))  # 세션당 최대 구간 수 (기본 8시간)
+SUMMARY_CLOCK_TOLERANCE_SECONDS = int(os.environ.get('SUMMARY_CLOCK_TOLERANCE_SECONDS', 300))  # 서버 시각보다 앞선 이벤트 허용 범위
+SUMMARY_CHUNK_BYTES = int(os.environ.get('SUMMARY_CHUNK_BYTES', 512 * 1024))  # 파티션 청크 문서당 배열 크기 (Firestore 문서 한도 1 MiB)
+SUMMARY_CACHE_SECONDS = int(os.environ.get('SUMMARY_CACHE_SECONDS', 30))  # 저장된 파티션 캐시 유지 시간
+SNAPSHOT_INTERVAL_SECONDS = int(os.environ.get('SNAPSHOT_INTERVAL_SECONDS', 300))
+SESSION_IDLE_TTL_SECONDS = int(os.environ.get('SESSION_IDLE_TTL_SECONDS', 3600))
+SUMMARY_COLLECTION = os.environ.get('SUMMARY_COLLECTION', 'attendance_summaries')
+
+if ACTIVITY_LOG_MODE not in ('event', 'snapshot', 'both'):
+    raise ValueError(f"지원하지 않는 ACTIVITY_LOG_MODE: {ACTIVITY_LOG_MODE}")
+
 # Storage 클라이언트 초기화
 storage_client = storage.Client()
 db = firestore.Client()
@@ -70,8 +95,507 @@ class CSIActivityClassifier:
         adjusted_threshold = 1.0 * threshold_multiplier
         return score > adjusted_threshold, score
 
+class SessionAggregate:
+    """
+    한 세션의 학생별/시간 구간별 활동 집계
+
+    (학생 수 x 구간 수) 크기의 NumPy 배열에 샘플 수, 활동 샘플 수, 신뢰도 합을 누적하며
+    배열은 필요할 때 두 배씩 확장됨 (구간 수는 max_buckets 이하로 제한)
+    """
+
+    def __init__(self, session_id, bucket_seconds, origin_bucket, max_buckets, partition_id=None):
+        self.session_id = session_id
+        self.bucket_seconds = bucket_seconds
+        self.origin_bucket = origin_bucket  # 첫 번째 열에 해당하는 구간 번호 (epoch / bucket_seconds)
+        self.max_buckets = max_buckets
+        self.partition_id = partition_id or uuid.uuid4().hex  # 스냅샷 문서 ID (집계 인스턴스마다 고유)
+        self.sequence = 0  # 누적된 이벤트 수 (같은 파티션의 오래된 스냅샷이 최신 스냅샷을 덮어쓰지 않도록 비교)
+        self.num_buckets = 0
+        self.student_index = {}
+        self.sample_counts = np.zeros((4, min(16, max_buckets)), dtype=np.int32)
+        self.active_counts = np.zeros_like(self.sample_counts)
+        self.confidence_sums = np.zeros(self.sample_counts.shape, dtype=np.float32)
+        self.last_event_at = time.time()
+        self.last_snapshot_at = 0.0  # 첫 이벤트에서 바로 스냅샷을 저장해 세션 문서를 생성
+
+    def _resize(self, rows, cols, col_offset=0):
+        """배열 크기 확장 (col_offset 만큼 기존 데이터를 오른쪽으로 이동)"""
+        used = self.num_buckets
+        arrays = []
+        for array in (self.sample_counts, self.active_counts, self.confidence_sums):
+            resized = np.zeros((rows, cols), dtype=array.dtype)
+            resized[:array.shape[0], col_offset:col_offset + used] = array[:, :used]
+            arrays.append(resized)
+        self.sample_counts, self.active_counts, self.confidence_sums = arrays
+
+    def _student_row(self, student_id):
+        row = self.student_index.get(student_id)
+        if row is None:
+            row = len(self.student_index)
+            if row >= self.sample_counts.shape[0]:
+                self._resize(row * 2, self.sample_counts.shape[1])
+            self.student_index[student_id] = row
+        return row
+
+    def _bucket_column(self, bucket):
+        """구간 번호에 해당하는 열 반환 (세션 범위가 max_buckets를 넘으면 None)"""
+        column = bucket - self.origin_bucket
+        capacity = self.sample_counts.shape[1]
+
+        # 첫 구간보다 이른 이벤트: 기존 열을 오른쪽으로 밀어 공간 확보
+        if column < 0:
+            shift = -column
+            if self.num_buckets + shift > self.max_buckets:
+                return None
+            cols = min(max(capacity * 2, self.num_buckets + shift), self.max_buckets)
+            self._resize(self.sample_counts.shape[0], max(cols, capacity), shift)
+            self.origin_bucket = bucket
+            self.num_buckets += shift
+            return 0
+
+        if column >= self.max_buckets:
+            return None
+        if column >= capacity:
+            self._resize(self.sample_counts.shape[0], min(max(capacity * 2, column + 1), self.max_buckets))
+        self.num_buckets = max(self.num_buckets, column + 1)
+        return column
+
+    def record(self, student_id, event_time, is_active, confidence):
+        """예측 결과 한 건을 해당 학생/구간에 누적 (세션 범위를 벗어나면 False)"""
+        column = self._bucket_column(int(event_time // self.bucket_seconds))
+        if column is None:
+            return False
+        row = self._student_row(student_id)
+        self.sample_counts[row, column] += 1
+        if is_active:
+            self.active_counts[row, column] += 1
+        self.confidence_sums[row, column] += confidence
+        self.sequence += 1
+        self.last_event_at = time.time()
+        return True
+
+    def to_document(self):
+        """Firestore 저장용 문서 생성 (배열은 리틀 엔디언 바이트로 직렬화)"""
+        n_students = len(self.student_index)
+        n_buckets = self.num_buckets
+        return {
+            'session_id': self.session_id,
+            'partition_id': self.partition_id,
+            'sequence': self.sequence,
+            'bucket_seconds': self.bucket_seconds,
+            'origin_bucket': self.origin_bucket,
+            'num_buckets': n_buckets,
+            'students': sorted(self.student_index, key=self.student_index.get),
+            'sample_counts': self.sample_counts[:n_students, :n_buckets].astype('<i4').tobytes(),
+            'active_counts': self.active_counts[:n_students, :n_buckets].astype('<i4').tobytes(),
+            'confidence_sums': self.confidence_sums[:n_students, :n_buckets].astype('<f4').tobytes()
+        }
+
+    @classmethod
+    def from_document(cls, document, max_buckets):
+        """to_document()로 저장한 문서에서 집계 복원"""
+        aggregate = cls(document['session_id'], document['bucket_seconds'], document['origin_bucket'],
+                        max(max_buckets, document['num_buckets']), document['partition_id'])
+        shape = (len(document['students']), document['num_buckets'])
+        aggregate.sequence = document['sequence']
+        aggregate.student_index = {student_id: row for row, student_id in enumerate(document['students'])}
+        aggregate.num_buckets = shape[1]
+        aggregate.sample_counts = np.frombuffer(document['sample_counts'], dtype='<i4').reshape(shape).astype(np.int32)
+        aggregate.active_counts = np.frombuffer(document['active_counts'], dtype='<i4').reshape(shape).astype(np.int32)
+        aggregate.confidence_sums = np.frombuffer(document['confidence_sums'], dtype='<f4').reshape(shape).astype(np.float32)
+        return aggregate
+
+    @classmethod
+    def merge(cls, session_id, aggregates, max_buckets):
+        """여러 파티션의 집계를 하나로 합침 (범위가 max_buckets를 넘으면 최근 구간만 유지)"""
+        aggregates = [aggregate for aggregate in aggregates if aggregate.num_buckets > 0]
+        bucket_seconds = aggregates[0].bucket_seconds if aggregates else SUMMARY_BUCKET_SECONDS
+        compatible = [aggregate for aggregate in aggregates if aggregate.bucket_seconds == bucket_seconds]
+        if len(compatible) < len(aggregates):
+            logger.warning(f"구간 크기가 다른 파티션 {len(aggregates) - len(compatible)}개 제외됨: {session_id}")
+
+        student_index = {}
+        for aggregate in compatible:
+            for student_id in sorted(aggregate.student_index, key=aggregate.student_index.get):
+                student_index.setdefault(student_id, len(student_index))
+
+        end = max((aggregate.origin_bucket + aggregate.num_buckets for aggregate in compatible), default=0)
+        start = max(min((aggregate.origin_bucket for aggregate in compatible), default=0), end - max_buckets)
+
+        merged = cls(session_id, bucket_seconds, start, max_buckets)
+        merged.student_index = student_index
+        merged.num_buckets = end - start
+        shape = (len(student_index), merged.num_buckets)
+        merged.sample_counts = np.zeros(shape, dtype=np.int32)
+        merged.active_counts = np.zeros(shape, dtype=np.int32)
+        merged.confidence_sums = np.zeros(shape, dtype=np.float32)
+
+        for aggregate in compatible:
+            skip = max(0, start - aggregate.origin_bucket)
+            width = aggregate.num_buckets - skip
+            if width <= 0:
+                continue
+            rows = np.array([student_index[student_id] for student_id in
+                             sorted(aggregate.student_index, key=aggregate.student_index.get)], dtype=np.intp)
+            offset = aggregate.origin_bucket + skip - start
+            n_rows = len(rows)
+            merged.sample_counts[rows, offset:offset + width] += aggregate.sample_counts[:n_rows, skip:skip + width]
+            merged.active_counts[rows, offset:offset + width] += aggregate.active_counts[:n_rows, skip:skip + width]
+            merged.confidence_sums[rows, offset:offset + width] += aggregate.confidence_sums[:n_rows, skip:skip + width]
+        return merged
+
+    def summary(self):
+        """세션 요약 생성 (학생별 활동 비율 및 구간별 타임라인)"""
+        n_students = len(self.student_index)
+        n_buckets = self.num_buckets
+        samples = self.sample_counts[:n_students, :n_buckets]
+        actives = self.active_counts[:n_students, :n_buckets]
+        confidences = self.confidence_sums[:n_students, :n_buckets]
+
+        sample_totals = samples.sum(axis=1)
+        active_totals = actives.sum(axis=1)
+        confidence_totals = confidences.sum(axis=1, dtype=np.float64)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            bucket_ratios = np.where(samples > 0, actives / samples, np.nan)
+
+        students = {}
+        for student_id, row in self.student_index.items():
+            total = int(sample_totals[row])
+            students[student_id] = {
+                'samples': total,
+                'active_samples': int(active_totals[row]),
+                'active_ratio': float(active_totals[row] / total) if total else 0.0,
+                'mean_confidence': float(confidence_totals[row] / total) if total else 0.0,
+                'bucket_active_ratios': [
+                    None if np.isnan(ratio) else round(float(ratio), 4)
+                    for ratio in bucket_ratios[row]
+                ]
+            }
+
+        start_epoch = self.origin_bucket * self.bucket_seconds
+        return {
+            'session_id': self.session_id,
+            'bucket_seconds': self.bucket_seconds,
+            'start_time': datetime.fromtimestamp(start_epoch, tz=timezone.utc).isoformat(),
+            'num_buckets': n_buckets,
+            'bucket_sample_counts': samples.sum(axis=0).tolist(),
+            'bucket_active_counts': actives.sum(axis=0).tolist(),
+            'students': students
+        }
+
+
+class AttendanceAggregator:
+    """
+    인스턴스 메모리에서 세션별 출석 집계를 유지하는 엔진
+
+    Firestore 쓰기는 잠금 밖에서 수행하며, 스냅샷 저장 시점과
+    유휴/종료 세션 제거는 요청 처리 중에 판단함
+    """
+
+    def __init__(self, bucket_seconds, snapshot_interval, idle_ttl, max_buckets, clock_tolerance):
+        self.bucket_seconds = bucket_seconds
+        self.snapshot_interval = snapshot_interval
+        self.idle_ttl = idle_ttl
+        self.max_buckets = max_buckets
+        self.clock_tolerance = clock_tolerance
+        self.sessions = {}
+        self.unsaved = []  # 최종 스냅샷 저장에 실패해 재시도를 기다리는 집계
+        self.lock = threading.Lock()
+        self.last_eviction_check = time.time()
+        logger.info(f"출석 집계 엔진 초기화 (bucket={bucket_seconds}s, max_buckets={max_buckets}, "
+                    f"snapshot={snapshot_interval}s, ttl={idle_ttl}s)")
+
+    def record(self, session_id, student_id, event_time, is_active, confidence):
+        """예측 결과 누적 후 스냅샷 저장이 필요한 경우 저장용 문서를 반환"""
+        now = time.time()
+        if not now - self.max_buckets * self.bucket_seconds <= event_time <= now + self.clock_tolerance:
+            logger.warning(f"허용 범위를 벗어난 이벤트 시각 무시: {session_id}/{student_id} "
+                           f"({datetime.fromtimestamp(event_time, tz=timezone.utc).isoformat()})")
+            return None
+
+        with self.lock:
+            aggregate = self.sessions.get(session_id)
+            if aggregate is None:
+                aggregate = SessionAggregate(session_id, self.bucket_seconds,
+                                             int(event_time // self.bucket_seconds), self.max_buckets)
+                self.sessions[session_id] = aggregate
+            if not aggregate.record(student_id, event_time, is_active, confidence):
+                logger.warning(f"세션 범위({self.max_buckets}개 구간)를 벗어난 이벤트 무시: {session_id}/{student_id}")
+                return None
+
+            if now - aggregate.last_snapshot_at >= self.snapshot_interval:
+                aggregate.last_snapshot_at = now
+                return aggregate.to_document()
+        return None
+
+    def local(self, session_id):
+        """메모리에 있는 세션 집계(저장 대기 중인 집계 포함)의 복사본 목록 반환"""
+        with self.lock:
+            aggregates = [aggregate for aggregate in self.unsaved if aggregate.session_id == session_id]
+            if session_id in self.sessions:
+                aggregates.append(self.sessions[session_id])
+            return [SessionAggregate.from_document(aggregate.to_document(), self.max_buckets)
+                    for aggregate in aggregates]
+
+    def close(self, session_id):
+        """세션 집계(저장 대기 중인 집계 포함)를 메모리에서 제거하고 목록 반환"""
+        with self.lock:
+            closed = [aggregate for aggregate in self.unsaved if aggregate.session_id == session_id]
+            self.unsaved = [aggregate for aggregate in self.unsaved if aggregate.session_id != session_id]
+            if session_id in self.sessions:
+                closed.append(self.sessions.pop(session_id))
+            return closed
+
+    def restore(self, aggregate):
+        """최종 스냅샷 저장에 실패한 집계를 메모리에 되돌림 (다음 유휴 세션 정리 시 재시도)"""
+        with self.lock:
+            if aggregate.session_id not in self.sessions:
+                self.sessions[aggregate.session_id] = aggregate
+            else:
+                self.unsaved.append(aggregate)
+
+    def evict_idle(self):
+        """유휴 시간이 TTL을 넘은 세션과 저장 대기 중인 집계를 제거하고 목록 반환"""
+        now = time.time()
+        with self.lock:
+            if now - self.last_eviction_check < min(self.idle_ttl, 60):
+                return []
+            self.last_eviction_check = now
+
+            expired = [session_id for session_id, aggregate in self.sessions.items()
+                       if now - aggregate.last_event_at >= self.idle_ttl]
+            evicted = [self.sessions.pop(session_id) for session_id in expired] + self.unsaved
+            self.unsaved = []
+        if evicted:
+            logger.info(f"유휴 세션 {len(evicted)}개 제거됨")
+        return evicted
+
+
+class SummaryHistoryCache:
+    """
+    Firestore에 저장된 세션 파티션을 병합해 TTL 동안 메모리에 보관하는 캐시
+
+    요약 조회마다 파티션을 다시 읽지 않도록 하며, 이 인스턴스가 스냅샷을 저장하면
+    Firestore를 다시 읽지 않고 해당 파티션만 갱신함
+    """
+
+    def __init__(self, ttl, max_buckets, loader):
+        self.ttl = ttl
+        self.max_buckets = max_buckets
+        self.loader = loader  # session_id -> ({partition_id: (집계, final)}, closed)
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, session_id, exclude):
+        """
+        exclude(메모리 집계로 대체할 파티션 ID)를 뺀 저장 이력 반환
+
+        반환값: (병합된 집계 또는 None, 파티션 수, 모든 파티션이 final인지 여부, 세션 종료 여부)
+        """
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(session_id)
+            fresh = entry is not None and now - entry['loaded_at'] < self.ttl
+
+        if not fresh:
+            partitions, closed = self.loader(session_id)
+            with self.lock:
+                self.entries = {key: value for key, value in self.entries.items()
+                                if now - value['loaded_at'] < self.ttl}
+                previous = self.entries.get(session_id)
+                if previous:
+                    # 읽는 동안 이 인스턴스가 저장한 더 최신 파티션은 유지
+                    for partition_id, (aggregate, final) in previous['partitions'].items():
+                        stored = partitions.get(partition_id)
+                        if stored is None or (stored[0].sequence, stored[1]) < (aggregate.sequence, final):
+                            partitions[partition_id] = (aggregate, final)
+                    closed = closed or previous['closed']
+                entry = {'loaded_at': now, 'partitions': partitions, 'closed': closed,
+                         'merged_key': None, 'merged': None}
+                self.entries[session_id] = entry
+
+        with self.lock:
+            key = frozenset(exclude) & entry['partitions'].keys()
+            if entry['merged_key'] != key:
+                included = [aggregate for partition_id, (aggregate, _) in entry['partitions'].items()
+                            if partition_id not in key]
+                entry['merged'] = SessionAggregate.merge(session_id, included, self.max_buckets) if included else None
+                entry['merged_key'] = key
+            finals = [final for partition_id, (_, final) in entry['partitions'].items() if partition_id not in key]
+            return entry['merged'], len(finals), all(finals), entry['closed']
+
+    def store(self, session_id, document, final, closed):
+        """이 인스턴스가 저장한 파티션/종료 여부를 캐시에 반영 (캐시에 없는 세션은 다음 조회 때 읽음)"""
+        with self.lock:
+            entry = self.entries.get(session_id)
+            if entry is None:
+                return
+            if document is not None:
+                entry['partitions'][document['partition_id']] = (
+                    SessionAggregate.from_document(document, self.max_buckets), final)
+                entry['merged_key'] = None
+            entry['closed'] = entry['closed'] or closed
+
 # 모델 인스턴스 생성
 model = CSIActivityClassifier()
+aggregator = AttendanceAggregator(SUMMARY_BUCKET_SECONDS, SNAPSHOT_INTERVAL_SECONDS, SESSION_IDLE_TTL_SECONDS,
+                                  SUMMARY_MAX_BUCKETS, SUMMARY_CLOCK_TOLERANCE_SECONDS)
+
+def parse_event_time(timestamp):
+    """ISO 8601 타임스탬프를 epoch 초로 변환 (파싱 실패 시 현재 시각)"""
+    try:
+        parsed = datetime.fromisoformat(str(timestamp).replace('Z', '+00:00'))
+        if parsed.tzinfo is None:
+            parsed = parsed.astimezone()
+        return parsed.timestamp()
+    except ValueError:
+        logger.warning(f"타임스탬프 파싱 실패, 현재 시각 사용: {timestamp}")
+        return time.time()
+
+def run_in_transaction(callback, *args):
+    """Firestore 트랜잭션 안에서 callback(transaction, *args) 실행"""
+    return firestore.transactional(callback)(db.transaction(), *args)
+
+def split_partition_document(document, final):
+    """파티션 문서를 메타데이터와 SUMMARY_CHUNK_BYTES 이하의 학생 단위 청크로 분할"""
+    array_row_bytes = 4 * max(document['num_buckets'], 1)  # 배열 하나에서 학생 한 명이 차지하는 바이트
+    rows_per_chunk = max(1, SUMMARY_CHUNK_BYTES // (3 * array_row_bytes))
+    students = document['students']
+
+    chunks = []
+    for start in range(0, max(len(students), 1), rows_per_chunk):
+        end = start + rows_per_chunk
+        byte_range = slice(start * array_row_bytes, end * array_row_bytes)
+        chunks.append({
+            'sequence': document['sequence'],
+            'students': students[start:end],
+            'sample_counts': document['sample_counts'][byte_range],
+            'active_counts': document['active_counts'][byte_range],
+            'confidence_sums': document['confidence_sums'][byte_range]
+        })
+
+    meta = {key: value for key, value in document.items()
+            if key not in ('students', 'sample_counts', 'active_counts', 'confidence_sums')}
+    meta.update({'final': final, 'chunk_count': len(chunks), 'updated_at': firestore.SERVER_TIMESTAMP})
+    return meta, chunks
+
+def join_partition_chunks(meta, chunks):
+    """split_partition_document()로 나눈 청크를 하나의 파티션 문서로 결합"""
+    return {
+        **meta,
+        'students': [student_id for chunk in chunks for student_id in chunk['students']],
+        'sample_counts': b''.join(chunk['sample_counts'] for chunk in chunks),
+        'active_counts': b''.join(chunk['active_counts'] for chunk in chunks),
+        'confidence_sums': b''.join(chunk['confidence_sums'] for chunk in chunks)
+    }
+
+def write_summary_snapshot(transaction, session_ref, document, final, close):
+    """
+    파티션과 세션 문서를 한 트랜잭션으로 저장
+
+    저장된 파티션보다 (sequence, final)이 새롭지 않으면 파티션 쓰기를 건너뛰고,
+    세션의 closed 값은 /close에서만 설정하며 해제하지 않음
+    반환값: (파티션 저장 여부, 세션 종료 여부)
+    """
+    session_snapshot = session_ref.get(transaction=transaction)
+    closed = close or (session_snapshot.exists and bool(session_snapshot.to_dict().get('closed')))
+
+    written = False
+    if document is not None:
+        partition_ref = session_ref.collection('partitions').document(document['partition_id'])
+        partition_snapshot = partition_ref.get(transaction=transaction)
+        current = partition_snapshot.to_dict() if partition_snapshot.exists else None
+
+        if current is None or (current['sequence'], current['final']) < (document['sequence'], final):
+            meta, chunks = split_partition_document(document, final)
+            chunks_ref = partition_ref.collection('chunks')
+            for index, chunk in enumerate(chunks):
+                transaction.set(chunks_ref.document(f"{document['sequence']}-{index}"), chunk)
+            if current is not None and current['sequence'] != document['sequence']:
+                for index in range(current['chunk_count']):
+                    transaction.delete(chunks_ref.document(f"{current['sequence']}-{index}"))
+            transaction.set(partition_ref, meta)
+            written = True
+
+    fields = {'session_id': session_ref.id, 'updated_at': firestore.SERVER_TIMESTAMP}
+    if close:
+        fields['closed'] = True
+    transaction.set(session_ref, fields, merge=True)
+    return written, closed
+
+def save_summary_snapshot(session_id, document=None, final=False, close=False):
+    """
+    세션 집계 파티션을 Firestore에 저장 (저장 실패 시 False)
+
+    파티션은 {SUMMARY_COLLECTION}/{session_id}/partitions/{partition_id}에 저장되며
+    partition_id는 집계 인스턴스마다 고유하므로 다른 인스턴스의 데이터를 덮어쓰지 않음
+    final은 이 파티션에 더 이상 이벤트가 추가되지 않음을, close는 세션 종료를 의미함
+    """
+    try:
+        session_ref = db.collection(SUMMARY_COLLECTION).document(session_id)
+        written, closed = run_in_transaction(write_summary_snapshot, session_ref, document, final, close)
+    except Exception as db_error:
+        logger.error(f"세션 요약 스냅샷 저장 오류: {db_error}")
+        return False
+
+    summary_cache.store(session_id, document if written else None, final, closed)
+    if written:
+        logger.info(f"세션 요약 스냅샷 저장됨: {session_id} (sequence={document['sequence']}, final={final})")
+    elif document is not None:
+        logger.info(f"더 최신 스냅샷이 저장되어 있어 건너뜀: {session_id} (sequence={document['sequence']})")
+    return True
+
+def load_partition(partition_ref):
+    """파티션 메타데이터와 청크를 읽어 (집계, final) 반환 (쓰기와 겹쳐 청크가 없으면 None)"""
+    meta = partition_ref.get().to_dict()
+    chunks_ref = partition_ref.collection('chunks')
+    chunks = [chunks_ref.document(f"{meta['sequence']}-{index}").get() for index in range(meta['chunk_count'])]
+    if not all(chunk.exists for chunk in chunks):
+        return None
+    document = join_partition_chunks(meta, [chunk.to_dict() for chunk in chunks])
+    return SessionAggregate.from_document(document, SUMMARY_MAX_BUCKETS), meta['final']
+
+def load_summary_history(session_id):
+    """저장된 세션 파티션({partition_id: (집계, final)})과 종료 여부 조회"""
+    session_ref = db.collection(SUMMARY_COLLECTION).document(session_id)
+    session_doc = session_ref.get()
+    if not session_doc.exists:
+        return {}, False
+
+    partitions = {}
+    for partition_snapshot in session_ref.collection('partitions').stream():
+        partition_ref = session_ref.collection('partitions').document(partition_snapshot.id)
+        # 다른 인스턴스가 같은 파티션을 갱신하며 이전 청크를 지운 경우 한 번 더 읽음
+        partition = load_partition(partition_ref) or load_partition(partition_ref)
+        if partition is None:
+            logger.warning(f"파티션 청크를 읽지 못해 제외됨: {session_id}/{partition_snapshot.id}")
+            continue
+        partitions[partition_snapshot.id] = partition
+    return partitions, bool(session_doc.to_dict().get('closed'))
+
+summary_cache = SummaryHistoryCache(SUMMARY_CACHE_SECONDS, SUMMARY_MAX_BUCKETS, load_summary_history)
+
+def build_session_summary(session_id, local):
+    """메모리 집계 목록과 저장된 다른 파티션을 병합해 세션 요약 생성 (데이터가 없으면 None)"""
+    summary_extra = {}
+    try:
+        history, history_count, history_final, closed = summary_cache.get(
+            session_id, {aggregate.partition_id for aggregate in local})
+    except Exception as db_error:
+        logger.error(f"세션 요약 스냅샷 조회 오류: {db_error}")
+        history, history_count, history_final, closed = None, 0, True, False
+        summary_extra['db_error'] = str(db_error)
+
+    aggregates = local + ([history] if history else [])
+    if not aggregates:
+        return None
+
+    summary = SessionAggregate.merge(session_id, aggregates, SUMMARY_MAX_BUCKETS).summary()
+    summary['partitions'] = len(local) + history_count
+    summary['closed'] = closed or (not local and history_final)
+    summary.update(summary_extra)
+    return summary
 
 @app.route('/predict', methods=['POST'])
 def predict():
@@ -102,8 +626,27 @@ def predict():
             'timestamp': timestamp
         }
         
-        # 세션 및 학생 ID가 제공된 경우 Firestore에 결과 저장
+        # 세션 및 학생 ID가 제공된 경우 집계에 반영 (실패해도 예측 결과와 로그 저장은 유지)
         if session_id and student_id:
+            try:
+                if not isinstance(session_id, (str, int)) or not isinstance(student_id, (str, int)):
+                    raise ValueError(f"지원하지 않는 ID 형식: session_id={type(session_id)}, student_id={type(student_id)}")
+
+                # 라우트 경로의 session_id(문자열)와 일치하도록 문자열로 통일
+                snapshot = aggregator.record(str(session_id), str(student_id), parse_event_time(timestamp),
+                                             bool(is_active), float(confidence))
+                if snapshot:
+                    save_summary_snapshot(str(session_id), snapshot)
+                for evicted in aggregator.evict_idle():
+                    if not save_summary_snapshot(evicted.session_id, evicted.to_document(), final=True):
+                        aggregator.restore(evicted)
+
+            except Exception as aggregate_error:
+                logger.error(f"출석 집계 오류: {aggregate_error}")
+                traceback.print_exc()
+
+        # Firestore에 결과 저장
+        if session_id and student_id and ACTIVITY_LOG_MODE != 'snapshot':
             try:
                 # Firestore 컬렉션 참조
                 activity_ref = db.collection('activity_logs').document()
@@ -135,6 +678,60 @@ def predict():
             'timestamp': datetime.now().isoformat()
         }), 500
 
+@app.route('/sessions/<session_id>/summary', methods=['GET'])
+def session_summary(session_id):
+    """세션 출석 요약 조회 API (메모리 집계와 저장된 파티션을 병합)"""
+    try:
+        summary = build_session_summary(session_id, aggregator.local(session_id))
+        if summary is None:
+            return jsonify({
+                'error': f'Session not found: {session_id}',
+                'timestamp': datetime.now().isoformat()
+            }), 404
+
+        return jsonify(summary)
+
+    except Exception as e:
+        logger.error(f"세션 요약 조회 중 오류: {e}")
+        traceback.print_exc()
+        return jsonify({
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+@app.route('/sessions/<session_id>/close', methods=['POST'])
+def close_session(session_id):
+    """세션 종료 API (최종 스냅샷 저장 후 메모리에서 제거, 저장 실패 시 메모리에 유지)"""
+    pending = []
+    try:
+        pending = aggregator.close(session_id)
+        summary = build_session_summary(session_id, pending)
+        if summary is None:
+            return jsonify({
+                'error': f'Session not found: {session_id}',
+                'timestamp': datetime.now().isoformat()
+            }), 404
+
+        if not pending and not save_summary_snapshot(session_id, close=True):
+            raise RuntimeError(f'Failed to save closed state: {session_id}')
+        pending = [aggregate for aggregate in pending
+                   if not save_summary_snapshot(session_id, aggregate.to_document(), final=True, close=True)]
+        if pending:
+            raise RuntimeError(f'Failed to save final snapshot: {session_id}')
+
+        summary['closed'] = True
+        return jsonify(summary)
+
+    except Exception as e:
+        for aggregate in pending:
+            aggregator.restore(aggregate)
+        logger.error(f"세션 종료 처리 중 오류: {e}")
+        traceback.print_exc()
+        return jsonify({
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """서비스 상태 확인 API"""
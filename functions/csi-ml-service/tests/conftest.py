@@ -0,0 +1,118 @@
+import os
+import sys
+import uuid
+from unittest import mock
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# GCP 자격 증명 없이 main 모듈을 불러오기 위해 클라이언트 생성자를 대체
+with mock.patch('google.cloud.storage.Client'), mock.patch('google.cloud.firestore.Client'):
+    import main
+
+
+class FakeSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeDocumentRef:
+    def __init__(self, store, path):
+        self.store = store
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    def set(self, data, merge=False):
+        self.store.check()
+        if merge and self.path in self.store:
+            self.store[self.path] = {**self.store[self.path], **data}
+        else:
+            self.store[self.path] = dict(data)
+
+    def get(self, transaction=None):
+        self.store.check()
+        return FakeSnapshot(self.id, self.store.get(self.path))
+
+    def collection(self, name):
+        return FakeCollectionRef(self.store, f'{self.path}/{name}')
+
+
+class FakeCollectionRef:
+    def __init__(self, store, path):
+        self.store = store
+        self.path = path
+
+    def document(self, doc_id=None):
+        return FakeDocumentRef(self.store, f'{self.path}/{doc_id or uuid.uuid4().hex}')
+
+    def stream(self):
+        self.store.check()
+        self.store.stream_calls += 1
+        prefix = f'{self.path}/'
+        return [FakeSnapshot(path[len(prefix):], data) for path, data in self.store.items()
+                if path.startswith(prefix) and '/' not in path[len(prefix):]]
+
+
+class FakeStore(dict):
+    def __init__(self):
+        super().__init__()
+        self.failing = False
+        self.stream_calls = 0
+
+    def check(self):
+        if self.failing:
+            raise RuntimeError('firestore unavailable')
+
+
+class FakeTransaction:
+    """쓰기를 즉시 반영하는 트랜잭션 (테스트는 순차 실행되므로 격리가 필요 없음)"""
+
+    def set(self, ref, data, merge=False):
+        ref.set(data, merge=merge)
+
+    def delete(self, ref):
+        ref.store.check()
+        ref.store.pop(ref.path, None)
+
+
+class FakeFirestore:
+    """경로 -> 문서 딕셔너리로 동작하는 최소한의 Firestore 대체 클라이언트"""
+
+    def __init__(self):
+        self.store = FakeStore()
+
+    def collection(self, name):
+        return FakeCollectionRef(self.store, name)
+
+    def documents(self, collection_path):
+        return {path: data for path, data in self.store.items()
+                if path.rsplit('/', 1)[0] == collection_path}
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    db = FakeFirestore()
+    monkeypatch.setattr(main, 'db', db)
+    monkeypatch.setattr(main, 'run_in_transaction', lambda callback, *args: callback(FakeTransaction(), *args))
+    return db
+
+
+@pytest.fixture
+def service(monkeypatch, fake_db):
+    """ACTIVITY_LOG_MODE를 지정해 새 집계 엔진과 Flask 테스트 클라이언트를 구성"""
+
+    def configure(mode):
+        monkeypatch.setattr(main, 'ACTIVITY_LOG_MODE', mode)
+        monkeypatch.setattr(main, 'aggregator', main.AttendanceAggregator(
+            60, 0, 3600, main.SUMMARY_MAX_BUCKETS, 300))
+        monkeypatch.setattr(main, 'summary_cache', main.SummaryHistoryCache(
+            30, main.SUMMARY_MAX_BUCKETS, main.load_summary_history))
+        return main.app.test_client()
+
+    return configure
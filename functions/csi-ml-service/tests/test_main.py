@@ -0,0 +1,326 @@
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from conftest import main
+
+ACTIVE_CSI = [0, 10, 0, 10]
+INACTIVE_CSI = [1, 1, 1, 1]
+ORIGIN = 1_700_000_000 // 60
+
+
+def make_aggregate(max_buckets=480):
+    return main.SessionAggregate('S', 60, ORIGIN, max_buckets)
+
+
+def iso(epoch):
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).isoformat()
+
+
+def post_predict(client, csi_data, **fields):
+    return client.post('/predict', json={'csi_data': csi_data, **fields})
+
+
+# SessionAggregate
+
+def test_earlier_bucket_shifts_existing_columns():
+    aggregate = make_aggregate()
+    aggregate.record('a', (ORIGIN + 2) * 60, True, 1.0)
+    aggregate.record('a', (ORIGIN - 3) * 60, False, 0.5)
+
+    assert aggregate.origin_bucket == ORIGIN - 3
+    assert aggregate.num_buckets == 6
+    summary = aggregate.summary()
+    assert summary['bucket_sample_counts'] == [1, 0, 0, 0, 0, 1]
+    assert summary['students']['a']['bucket_active_ratios'] == [0.0, None, None, None, None, 1.0]
+
+
+def test_student_rows_grow_past_initial_capacity():
+    aggregate = make_aggregate()
+    for student in range(10):
+        for _ in range(student + 1):
+            aggregate.record(f'st{student}', ORIGIN * 60, student % 2 == 0, 1.0)
+
+    assert aggregate.sample_counts.shape[0] >= 10
+    students = aggregate.summary()['students']
+    assert [students[f'st{i}']['samples'] for i in range(10)] == list(range(1, 11))
+    assert students['st9']['active_ratio'] == 0.0
+    assert students['st8']['active_ratio'] == 1.0
+
+
+def test_summary_ratios():
+    aggregate = make_aggregate()
+    aggregate.record('a', ORIGIN * 60, True, 2.0)
+    aggregate.record('a', ORIGIN * 60 + 30, False, 0.5)
+    aggregate.record('a', (ORIGIN + 1) * 60, True, 1.5)
+    aggregate.record('b', (ORIGIN + 1) * 60, False, 0.0)
+
+    summary = aggregate.summary()
+    assert summary['num_buckets'] == 2
+    assert summary['bucket_sample_counts'] == [2, 2]
+    assert summary['bucket_active_counts'] == [1, 1]
+    assert summary['students']['a']['active_ratio'] == pytest.approx(2 / 3)
+    assert summary['students']['a']['mean_confidence'] == pytest.approx(4.0 / 3)
+    assert summary['students']['a']['bucket_active_ratios'] == [0.5, 1.0]
+    assert summary['students']['b']['bucket_active_ratios'] == [None, 0.0]
+
+
+def test_events_outside_max_buckets_are_dropped():
+    aggregate = make_aggregate(max_buckets=10)
+    assert aggregate.record('a', ORIGIN * 60, True, 1.0)
+    assert aggregate.record('a', (ORIGIN + 9) * 60, True, 1.0)
+    assert not aggregate.record('a', (ORIGIN + 10) * 60, True, 1.0)
+    assert not aggregate.record('a', (ORIGIN - 1) * 60, True, 1.0)
+
+    assert aggregate.num_buckets == 10
+    assert aggregate.sample_counts.shape[1] <= 16
+    assert aggregate.summary()['students']['a']['samples'] == 2
+
+
+def test_document_round_trip_and_merge():
+    first = make_aggregate()
+    first.record('a', ORIGIN * 60, True, 1.0)
+    first.record('b', (ORIGIN + 1) * 60, False, 0.5)
+    second = main.SessionAggregate('S', 60, ORIGIN - 1, 480)
+    second.record('b', (ORIGIN - 1) * 60, True, 2.0)
+    second.record('c', (ORIGIN + 1) * 60, True, 1.0)
+
+    restored = main.SessionAggregate.from_document(first.to_document(), 480)
+    assert restored.summary() == first.summary()
+
+    merged = main.SessionAggregate.merge('S', [restored, second], 480).summary()
+    assert merged['num_buckets'] == 3
+    assert merged['bucket_sample_counts'] == [1, 1, 2]
+    assert merged['students']['b']['bucket_active_ratios'] == [1.0, None, 0.0]
+    assert merged['students']['c']['samples'] == 1
+
+
+# AttendanceAggregator
+
+def test_aggregator_rejects_timestamps_far_from_server_time():
+    aggregator = main.AttendanceAggregator(60, 3600, 3600, 480, 300)
+    now = time.time()
+    aggregator.record('S', 'a', now, True, 1.0)
+    aggregator.record('S', 'a', now + 10 * 365 * 86400, True, 1.0)
+    aggregator.record('S', 'a', 0, True, 1.0)
+
+    aggregate, = aggregator.local('S')
+    assert aggregate.num_buckets == 1
+    assert aggregate.sample_counts.shape[1] <= 16
+
+
+# Flask API
+
+@pytest.mark.parametrize('mode, writes_events', [
+    ('event', True),
+    ('snapshot', False),
+    ('both', True),
+])
+def test_predict_persistence_by_mode(service, fake_db, mode, writes_events):
+    client = service(mode)
+    response = post_predict(client, ACTIVE_CSI, session_id='S', student_id='a', timestamp=iso(time.time()))
+
+    assert response.status_code == 200
+    assert ('log_id' in response.get_json()) == writes_events
+    assert bool(fake_db.documents('activity_logs')) == writes_events
+    assert fake_db.documents(f'{main.SUMMARY_COLLECTION}/S/partitions')
+
+    summary = client.get('/sessions/S/summary').get_json()
+    assert summary['students']['a']['active_ratio'] == 1.0
+    assert summary['closed'] is False
+
+
+@pytest.mark.parametrize('mode', ['event', 'snapshot', 'both'])
+def test_summary_survives_close(service, mode):
+    client = service(mode)
+    post_predict(client, ACTIVE_CSI, session_id='S', student_id='a')
+    post_predict(client, INACTIVE_CSI, session_id='S', student_id='a')
+
+    closed = client.post('/sessions/S/close')
+    assert closed.status_code == 200
+    assert closed.get_json()['closed'] is True
+
+    summary = client.get('/sessions/S/summary').get_json()
+    assert summary['closed'] is True
+    assert summary['students']['a']['samples'] == 2
+    assert summary['students']['a']['active_ratio'] == 0.5
+
+
+def test_resumed_session_merges_with_stored_history(service):
+    client = service('snapshot')
+    post_predict(client, ACTIVE_CSI, session_id='S', student_id='a')
+    client.post('/sessions/S/close')
+    post_predict(client, INACTIVE_CSI, session_id='S', student_id='b')
+    post_predict(client, INACTIVE_CSI, session_id='S', student_id='a')
+
+    summary = client.get('/sessions/S/summary').get_json()
+    assert summary['partitions'] == 2
+    assert summary['closed'] is True
+    assert summary['students']['a']['samples'] == 2
+    assert summary['students']['b']['samples'] == 1
+
+
+def test_partitions_from_other_instances_are_merged(service, fake_db):
+    client = service('snapshot')
+    other = make_aggregate()
+    other.origin_bucket = int(time.time() // 60)
+    other.record('z', time.time(), True, 1.0)
+    assert main.save_summary_snapshot('S', other.to_document())
+
+    post_predict(client, INACTIVE_CSI, session_id='S', student_id='a')
+
+    summary = client.get('/sessions/S/summary').get_json()
+    assert set(summary['students']) == {'a', 'z'}
+
+
+def test_idle_eviction_marks_every_partition_final(service, fake_db):
+    client = service('snapshot')
+    post_predict(client, ACTIVE_CSI, session_id='S', student_id='a')
+    main.aggregator.idle_ttl = 0
+    main.aggregator.last_eviction_check = 0
+    post_predict(client, ACTIVE_CSI, session_id='T', student_id='a')
+
+    for partitions in ('S/partitions', 'T/partitions'):
+        stored = fake_db.documents(f'{main.SUMMARY_COLLECTION}/{partitions}')
+        assert [meta['final'] for meta in stored.values()] == [True]
+    assert main.aggregator.local('S') == []
+    assert client.get('/sessions/S/summary').get_json()['closed'] is True
+
+
+def test_invalid_ids_do_not_break_predict(service, fake_db):
+    client = service('event')
+    response = post_predict(client, ACTIVE_CSI, session_id='S', student_id=['a'])
+
+    assert response.status_code == 200
+    assert 'log_id' in response.get_json()
+    assert main.aggregator.local('S') == []
+
+
+def test_int_session_id_matches_route(service):
+    client = service('event')
+    post_predict(client, ACTIVE_CSI, session_id=42, student_id=7)
+
+    summary = client.get('/sessions/42/summary').get_json()
+    assert summary['session_id'] == '42'
+    assert summary['students']['7']['samples'] == 1
+
+
+def test_out_of_range_timestamp_is_ignored(service):
+    client = service('event')
+    post_predict(client, ACTIVE_CSI, session_id='S', student_id='a', timestamp=iso(time.time()))
+    response = post_predict(client, ACTIVE_CSI, session_id='S', student_id='a', timestamp='2999-01-01T00:00:00Z')
+
+    assert response.status_code == 200
+    summary = client.get('/sessions/S/summary').get_json()
+    assert summary['num_buckets'] == 1
+
+
+def test_unknown_session_returns_404(service):
+    client = service('event')
+    assert client.get('/sessions/missing/summary').status_code == 404
+    assert client.post('/sessions/missing/close').status_code == 404
+
+
+def test_stale_snapshot_does_not_overwrite_final_state(service):
+    client = service('snapshot')
+    post_predict(client, ACTIVE_CSI, session_id='S', student_id='a')
+    stale = main.aggregator.local('S')[0].to_document()
+    post_predict(client, INACTIVE_CSI, session_id='S', student_id='a')
+    assert client.post('/sessions/S/close').status_code == 200
+
+    assert main.save_summary_snapshot('S', stale)
+
+    main.summary_cache.entries.clear()
+    summary = client.get('/sessions/S/summary').get_json()
+    assert summary['students']['a']['samples'] == 2
+    assert summary['closed'] is True
+
+
+def test_close_from_another_instance_is_not_reopened(service, monkeypatch):
+    client = service('snapshot')
+    other = main.AttendanceAggregator(60, 0, 3600, main.SUMMARY_MAX_BUCKETS, 300)
+    now = time.time()
+    main.save_summary_snapshot('S', other.record('S', 'z', now, True, 1.0))
+
+    assert client.post('/sessions/S/close').status_code == 200
+    assert main.save_summary_snapshot('S', other.record('S', 'z', now, False, 1.0))
+
+    main.summary_cache.entries.clear()
+    summary = client.get('/sessions/S/summary').get_json()
+    assert summary['closed'] is True
+    assert summary['students']['z']['samples'] == 2
+
+
+def test_failed_close_keeps_aggregate_in_memory(service, fake_db):
+    client = service('snapshot')
+    post_predict(client, ACTIVE_CSI, session_id='S', student_id='a')
+    post_predict(client, ACTIVE_CSI, session_id='S', student_id='a')
+
+    fake_db.store.failing = True
+    assert client.post('/sessions/S/close').status_code == 500
+    fake_db.store.failing = False
+
+    assert main.aggregator.local('S')[0].sequence == 2
+    closed = client.post('/sessions/S/close')
+    assert closed.status_code == 200
+    assert closed.get_json()['students']['a']['samples'] == 2
+    assert client.get('/sessions/S/summary').get_json()['students']['a']['samples'] == 2
+
+
+def test_failed_eviction_is_retried(service, fake_db):
+    client = service('snapshot')
+    post_predict(client, ACTIVE_CSI, session_id='S', student_id='a')
+    main.aggregator.idle_ttl = 0
+    main.aggregator.last_eviction_check = 0
+
+    fake_db.store.failing = True
+    post_predict(client, ACTIVE_CSI, session_id='T', student_id='a')
+    fake_db.store.failing = False
+    assert main.aggregator.local('S')
+
+    main.aggregator.last_eviction_check = 0
+    post_predict(client, ACTIVE_CSI, session_id='U', student_id='a')
+    assert main.aggregator.local('S') == []
+    assert client.get('/sessions/S/summary').get_json()['closed'] is True
+
+
+def test_event_mode_summary_survives_cold_start(service):
+    client = service('event')
+    post_predict(client, ACTIVE_CSI, session_id='S', student_id='a')
+
+    client = service('event')
+    summary = client.get('/sessions/S/summary').get_json()
+    assert summary['students']['a']['samples'] == 1
+    assert summary['closed'] is False
+
+
+def test_summary_history_is_cached(service, fake_db):
+    client = service('snapshot')
+    other = main.AttendanceAggregator(60, 0, 3600, main.SUMMARY_MAX_BUCKETS, 300)
+    main.save_summary_snapshot('S', other.record('S', 'z', time.time(), True, 1.0))
+    post_predict(client, ACTIVE_CSI, session_id='S', student_id='a')
+
+    for _ in range(3):
+        assert client.get('/sessions/S/summary').status_code == 200
+    post_predict(client, ACTIVE_CSI, session_id='S', student_id='a')
+    summary = client.get('/sessions/S/summary').get_json()
+
+    assert fake_db.store.stream_calls == 1
+    assert summary['students']['a']['samples'] == 2
+    assert summary['students']['z']['samples'] == 1
+
+
+def test_large_partition_is_split_into_chunks(service, fake_db, monkeypatch):
+    service('snapshot')
+    monkeypatch.setattr(main, 'SUMMARY_CHUNK_BYTES', 1000)
+    aggregate = make_aggregate()
+    aggregate.origin_bucket = int(time.time() // 60) - 99
+    for student in range(25):
+        aggregate.record(f'st{student}', time.time() - student * 240, student % 3 == 0, 0.25 * student)
+    assert main.save_summary_snapshot('S', aggregate.to_document())
+
+    chunks = fake_db.documents(f'{main.SUMMARY_COLLECTION}/S/partitions/{aggregate.partition_id}/chunks')
+    assert len(chunks) > 1
+    partitions, _ = main.load_summary_history('S')
+    assert partitions[aggregate.partition_id][0].summary() == aggregate.summary()